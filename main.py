@@ -1,27 +1,145 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse # Changed from StreamingResponse
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from dotenv import load_dotenv
 import os
-import tempfile
+import re
+import sys
+import asyncio
 import logging
-import json
-import base64 # Added for Base64 encoding
-from typing import List, Dict, Optional
-
-# Import utility functions
-from utils.speech_recognition_stt import convert_audio_to_text
-from utils.gemini_api import generate_response_with_gemini
-from utils.elevenlabs_tts import convert_text_to_speech_stream
+import base64
+from typing import AsyncIterator, List, Dict, Literal, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
+# (before importing the utilities, which read their settings at import time)
 load_dotenv()
 
+# Import utility functions
+from utils.speech_recognition_stt import convert_audio_to_text, load_whisper_model
+from utils.gemini_api import stream_response_with_gemini, warm_up_gemini
+from utils.elevenlabs_tts import convert_text_to_speech_stream, warm_up_tts_client, close_tts_client
+
 app = FastAPI(title="Voice Chatbot API")
 
+class HistoryItem(BaseModel):
+    """A single conversation turn in the history sent with a voice chat request."""
+    role: Literal["user", "model"]
+    parts: List[str]
+
+# Built once; validates the history JSON in a single pydantic-core pass
+HISTORY_ADAPTER = TypeAdapter(List[HistoryItem])
+
+# Caps concurrent audio decoding/transcription jobs (CPU-bound) to the number of cores
+stt_semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+
+# Terminal punctuation followed by whitespace marks the end of a sentence
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+# Maximum number of sentences synthesized in parallel for a single response
+TTS_CONCURRENCY = 4
+
+# Queue marker for a sentence whose speech could not be synthesized
+TTS_FAILED = object()
+
+class SpeechSynthesisError(Exception):
+    """Raised while streaming a spoken response when a sentence could not be converted to speech."""
+
+async def generate_spoken_response(user_text: str, history: List[Dict[str, str]]) -> Tuple[str, AsyncIterator[bytes]]:
+    """
+    Streams the Gemini response and starts a TTS request for each sentence as soon as it is complete,
+    so speech synthesis overlaps with the remaining text generation. Up to TTS_CONCURRENCY sentences
+    are synthesized in parallel; their audio is still returned in sentence order.
+
+    Args:
+        user_text: The transcribed user input.
+        history: The parsed conversation history.
+
+    Returns:
+        A tuple of the full response text and an async iterator over the audio chunks,
+        in sentence order. The iterator raises SpeechSynthesisError when it reaches a sentence
+        that failed to convert, including one whose audio stream broke off partway, rather than
+        skipping or truncating that sentence's audio.
+    """
+    text_chunks: List[str] = []
+    tts_tasks: List[asyncio.Task] = []
+    audio_queues: List[asyncio.Queue] = []
+    pending_text = ""
+    tts_semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+
+    async def synthesize(sentence: str, queue: asyncio.Queue) -> None:
+        try:
+            async with tts_semaphore:
+                async for audio_chunk in convert_text_to_speech_stream(sentence):
+                    queue.put_nowait(audio_chunk)
+        except Exception:
+            # Covers failures before the first chunk and streams that break off partway;
+            # the error itself is already logged by convert_text_to_speech_stream
+            queue.put_nowait(TTS_FAILED)
+        else:
+            queue.put_nowait(None) # Sentinel: this sentence is complete
+
+    def submit(sentence: str) -> None:
+        sentence = sentence.strip()
+        if sentence:
+            queue: asyncio.Queue = asyncio.Queue()
+            audio_queues.append(queue)
+            tts_tasks.append(asyncio.create_task(synthesize(sentence, queue)))
+
+    async def audio_chunks() -> AsyncIterator[bytes]:
+        # Drain the per-sentence queues in submission order, so the audio lines up with the text
+        try:
+            for index, queue in enumerate(audio_queues, start=1):
+                while (audio_chunk := await queue.get()) is not None:
+                    if audio_chunk is TTS_FAILED:
+                        raise SpeechSynthesisError(f"Text-to-speech failed for sentence {index} of {len(audio_queues)}.")
+                    yield audio_chunk
+        finally:
+            # Stop outstanding synthesis if the client disconnects mid-stream
+            for task in tts_tasks:
+                task.cancel()
+
+    try:
+        async for chunk in stream_response_with_gemini(user_text, history=history):
+            text_chunks.append(chunk)
+            pending_text += chunk
+            # Everything before the last boundary is a complete sentence
+            *sentences, pending_text = SENTENCE_BOUNDARY.split(pending_text)
+            for sentence in sentences:
+                submit(sentence)
+        submit(pending_text)
+        logger.info(f"Submitted {len(tts_tasks)} TTS request(s) while streaming the response.")
+    except BaseException:
+        for task in tts_tasks:
+            task.cancel()
+        raise
+
+    return "".join(text_chunks), audio_chunks()
+
+def encode_header_text(text: str) -> str:
+    """Base64-encodes text so arbitrary Unicode can be sent in an HTTP header."""
+    return base64.b64encode(text.encode("utf-8")).decode("ascii")
+
+@app.on_event("startup")
+async def startup_event():
+    """
+    Loads the Whisper model and warms up connections to the Gemini and ElevenLabs backends
+    before serving requests. Runs in each worker process, never in a uvicorn parent process.
+    """
+    await asyncio.gather(
+        warm_up_tts_client(),
+        asyncio.to_thread(warm_up_gemini),
+        asyncio.to_thread(load_whisper_model)
+    )
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Releases pooled connections held by the shared HTTP clients."""
+    await close_tts_client()
+
 @app.get("/")
 async def read_root():
     """Root endpoint to check if the API is running."""
@@ -38,65 +156,80 @@ async def chat_voice_endpoint(
     Handles voice chat interaction:
     1. Receives audio file and optional conversation history.
     2. Transcribes audio to text.
-    3. Generates a text response using Gemini (with history).
-    4. Converts the text response to speech audio using ElevenLabs.
-    5. Streams the audio response back.
+    3. Streams a text response from Gemini (with history).
+    4. Converts each completed sentence to speech using ElevenLabs while generation continues.
+    5. Streams the MP3 audio back as it is synthesized. The transcription and response text
+       are returned Base64-encoded (UTF-8) in the X-User-Transcription and X-Bot-Text headers.
     """
-    temp_audio_path = None
     try:
-        # 1. Save uploaded audio file temporarily
-        suffix = os.path.splitext(audio_file.filename)[1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_audio:
-            content = await audio_file.read()
-            temp_audio.write(content)
-            temp_audio_path = temp_audio.name
-        logger.info(f"Temporary audio file saved at: {temp_audio_path}")
+        logger.info(f"Received audio file: {audio_file.filename}")
         logger.info(f"Received language code: {language_code}")
 
-        # 2. Transcribe audio to text using the provided language code
-        user_text = convert_audio_to_text(temp_audio_path, language=language_code)
+        # 1. Transcribe the upload directly from its spooled file using the provided language code
+        # Run in a worker thread so the blocking decode and recognition call don't stall the event loop
+        async with stt_semaphore:
+            user_text = await asyncio.to_thread(convert_audio_to_text, audio_file.file, language=language_code)
         if not user_text:
             logger.error(f"Transcription failed for language: {language_code}.")
             raise HTTPException(status_code=400, detail="Failed to transcribe audio.")
         logger.info(f"Transcription successful: '{user_text}'")
 
-        # 3. Parse conversation history if provided
+        # 2. Parse conversation history if provided
         history: List[Dict[str, str]] = []
         if history_json:
             try:
-                history = json.loads(history_json)
-                # Basic validation (optional but recommended)
-                if not isinstance(history, list) or not all(isinstance(item, dict) and 'role' in item and 'parts' in item for item in history):
-                    raise ValueError("Invalid history format.")
+                history = [item.model_dump() for item in HISTORY_ADAPTER.validate_json(history_json)]
                 logger.info(f"Parsed conversation history ({len(history)} items).")
-            except (json.JSONDecodeError, ValueError) as e:
+            except ValidationError as e:
                 logger.error(f"Failed to parse history JSON: {e}")
                 raise HTTPException(status_code=400, detail=f"Invalid history format: {e}")
 
-        # 4. Generate text response using Gemini
-        bot_text_response = generate_response_with_gemini(user_text, history=history)
+        # 3. Generate text response using Gemini, converting it to speech sentence by sentence
+        try:
+            bot_text_response, audio_stream = await generate_spoken_response(user_text, history)
+        except Exception as e:
+            # Generation failed (possibly partway through); pending TTS requests are already cancelled
+            logger.error(f"Gemini response generation failed: {e}")
+            raise HTTPException(status_code=500, detail="Failed to generate response from language model.")
         if not bot_text_response:
             logger.error("Gemini response generation failed.")
             raise HTTPException(status_code=500, detail="Failed to generate response from language model.")
         logger.info(f"Gemini response generated: '{bot_text_response[:100]}...'")
 
-        # 5. Convert text response to speech audio
-        audio_stream_bytes = convert_text_to_speech_stream(bot_text_response)
-        if not audio_stream_bytes:
+        # 4. Wait for the first audio chunk so a failed conversion can still be reported as an error
+        try:
+            first_audio_chunk = await anext(audio_stream, None)
+        except SpeechSynthesisError as e:
+            logger.error(str(e))
+            first_audio_chunk = None
+        if first_audio_chunk is None:
             logger.error("Text-to-speech conversion failed.")
             raise HTTPException(status_code=500, detail="Failed to convert response to speech.")
-        logger.info("Text-to-speech conversion successful.")
+        logger.info("Text-to-speech conversion started, streaming audio.")
 
-        # 6. Encode audio bytes to Base64
-        audio_base64 = base64.b64encode(audio_stream_bytes).decode('utf-8')
-        logger.info("Audio encoded to Base64.")
+        async def stream_audio() -> AsyncIterator[bytes]:
+            yield first_audio_chunk
+            try:
+                async for audio_chunk in audio_stream:
+                    yield audio_chunk
+            except Exception as e:
+                # Headers are already sent at this point, so the stream can only be aborted.
+                # Re-raising makes the server drop the connection, so the client sees an incomplete
+                # transfer instead of audio that silently skips a sentence.
+                logger.error(f"Error while streaming audio response: {e}")
+                raise
+            finally:
+                await audio_stream.aclose()
 
-        # 7. Return JSON response with transcription, bot text, and Base64 audio
-        return JSONResponse(content={
-            "user_transcription": user_text,
-            "bot_response_text": bot_text_response,
-            "bot_response_audio": audio_base64 # Send Base64 encoded audio
-        })
+        # 5. Stream the MP3 audio, passing the texts in headers
+        return StreamingResponse(
+            stream_audio(),
+            media_type="audio/mpeg",
+            headers={
+                "X-User-Transcription": encode_header_text(user_text),
+                "X-Bot-Text": encode_header_text(bot_text_response)
+            }
+        )
 
     except HTTPException as http_exc:
         # Re-raise HTTPException to let FastAPI handle it
@@ -104,14 +237,6 @@ async def chat_voice_endpoint(
     except Exception as e:
         logger.error(f"An unexpected error occurred in /chat/voice: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An internal server error occurred.")
-    finally:
-        # Clean up the temporary audio file
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            try:
-                os.remove(temp_audio_path)
-                logger.info(f"Temporary audio file removed: {temp_audio_path}")
-            except Exception as e:
-                 logger.error(f"Error removing temporary file {temp_audio_path}: {e}")
 
 
 if __name__ == "__main__":
@@ -120,4 +245,9 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000)) # Keep default for local testing if needed
     # Use host="0.0.0.0" to bind to all interfaces, disable reload for production
     # Render will use the start command defined in its dashboard, but this is good practice
-    uvicorn.run("main:app", host="0.0.0.0", port=port) # Removed reload=True
+    # uvloop + httptools for faster socket I/O (uvloop isn't available on Windows)
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    # Each worker is a separate process that loads its own copy of the Whisper model on startup
+    # (the parent process only supervises and never loads one), so size this to the instance's memory
+    workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, loop=loop, http="httptools", workers=workers) # Removed reload=True
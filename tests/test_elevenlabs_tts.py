@@ -0,0 +1,73 @@
+import asyncio
+from collections import OrderedDict
+
+import httpx
+import pytest
+
+from utils import elevenlabs_tts
+
+
+class BrokenAudioStream(httpx.AsyncByteStream):
+    """Response body that sends some audio and then drops the connection."""
+
+    def __init__(self, audio: bytes):
+        self.audio = audio
+
+    async def __aiter__(self):
+        yield self.audio
+        raise httpx.ReadError("Connection dropped")
+
+
+def mock_client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture(autouse=True)
+def tts_config(monkeypatch):
+    monkeypatch.setattr(elevenlabs_tts, "ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(elevenlabs_tts, "_TTS_CACHE", OrderedDict())
+
+
+async def collect(text: str) -> list[bytes]:
+    return [chunk async for chunk in elevenlabs_tts.convert_text_to_speech_stream(text)]
+
+
+def test_streams_audio_and_caches_it(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=b"mp3" * 3000)
+
+    monkeypatch.setattr(elevenlabs_tts, "_CLIENT", mock_client(handler))
+
+    first = asyncio.run(collect("Hello."))
+    second = asyncio.run(collect("Hello."))
+
+    assert b"".join(first) == b"mp3" * 3000
+    assert b"".join(second) == b"mp3" * 3000
+    assert len(requests) == 1
+
+
+def test_error_status_raises(monkeypatch):
+    handler = lambda request: httpx.Response(401, json={"detail": "invalid api key"})
+    monkeypatch.setattr(elevenlabs_tts, "_CLIENT", mock_client(handler))
+
+    with pytest.raises(elevenlabs_tts.TextToSpeechError):
+        asyncio.run(collect("Hello."))
+
+
+def test_stream_broken_partway_raises_and_is_not_cached(monkeypatch):
+    handler = lambda request: httpx.Response(200, stream=BrokenAudioStream(b"x" * 5000))
+    monkeypatch.setattr(elevenlabs_tts, "_CLIENT", mock_client(handler))
+
+    received = []
+
+    async def consume():
+        async for chunk in elevenlabs_tts.convert_text_to_speech_stream("Hello."):
+            received.append(chunk)
+
+    with pytest.raises(elevenlabs_tts.TextToSpeechError):
+        asyncio.run(consume())
+    assert received  # The failure happened after audio had already been yielded
+    assert not elevenlabs_tts._TTS_CACHE
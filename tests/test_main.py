@@ -0,0 +1,45 @@
+import asyncio
+from collections import OrderedDict
+
+import httpx
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("faster_whisper")
+pytest.importorskip("google.generativeai")
+
+import main
+from utils import elevenlabs_tts
+
+from test_elevenlabs_tts import BrokenAudioStream
+
+
+def test_audio_stream_fails_when_a_sentence_breaks_off(monkeypatch):
+    async def fake_gemini_stream(user_text, history=None):
+        for chunk in ["First sentence. Second ", "sentence. Third sentence."]:
+            yield chunk
+
+    def handler(request):
+        text = request.content.decode()
+        if "Second sentence." in text:
+            return httpx.Response(200, stream=BrokenAudioStream(b"2" * 5000))
+        return httpx.Response(200, content=b"1" * 5000 if "First" in text else b"3" * 5000)
+
+    monkeypatch.setattr(main, "stream_response_with_gemini", fake_gemini_stream)
+    monkeypatch.setattr(elevenlabs_tts, "ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(elevenlabs_tts, "_TTS_CACHE", OrderedDict())
+    monkeypatch.setattr(elevenlabs_tts, "_CLIENT", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    received = []
+
+    async def run():
+        text, audio_stream = await main.generate_spoken_response("Hi", [])
+        assert text == "First sentence. Second sentence. Third sentence."
+        async for chunk in audio_stream:
+            received.append(chunk)
+
+    with pytest.raises(main.SpeechSynthesisError):
+        asyncio.run(run())
+    # Sentence 1 in full and part of sentence 2, but never sentence 3 after the broken one
+    assert b"3" not in b"".join(received)
+    assert b"".join(received).startswith(b"1" * 5000)
@@ -1,37 +1,98 @@
-import requests
+import httpx
+import asyncio
+import hashlib
 import os
 import logging
-from dotenv import load_dotenv
+from collections import OrderedDict
+from typing import AsyncIterator, List
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables from .env file
-load_dotenv()
-
 # ElevenLabs API Configuration
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 # You can change this to a preferred voice ID from your ElevenLabs account
 DEFAULT_VOICE_ID = "eVItLK1UvXctxuaRV2Oq" # Example: Default voice "Rachel"
 TTS_URL = f"https://api.elevenlabs.io/v1/text-to-speech/{DEFAULT_VOICE_ID}/stream"
+# Low-latency model for conversational use ("eleven_multilingual_v2" gives higher quality but is slower)
+TTS_MODEL_ID = "eleven_flash_v2_5"
+# 22.05 kHz / 32 kbps MP3: fewer bytes per second of speech, so the first chunk arrives sooner
+TTS_OUTPUT_FORMAT = "mp3_22050_32"
+
+# --- TTS Cache ---
+# In-process LRU cache of synthesized audio, so frequently repeated phrases
+# ("One moment", greetings, apologies) skip the API call entirely.
+TTS_CACHE_MAX_ENTRIES = 256
+TTS_CACHE_MAX_TEXT_LENGTH = 200 # Only short phrases are likely to repeat verbatim
+_TTS_CACHE: "OrderedDict[bytes, bytes]" = OrderedDict()
+
+# Shared async HTTP client, reused across requests so back-to-back TTS calls
+# skip the TCP/TLS handshake (HTTP/2 + keep-alive connection pooling).
+_CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=30,
+    limits=httpx.Limits(max_keepalive_connections=20)
+)
 
-def convert_text_to_speech_stream(text: str) -> bytes | None:
+async def warm_up_tts_client() -> None:
     """
-    Converts text to speech using the ElevenLabs API and returns the audio data as bytes.
+    Opens a pooled connection to ElevenLabs ahead of the first TTS request, so that request
+    doesn't pay for DNS, TCP and TLS setup. Failures are logged and otherwise ignored.
+    """
+    if not ELEVENLABS_API_KEY:
+        logger.warning("Skipping ElevenLabs warm-up: API key not configured.")
+        return
+    try:
+        response = await _CLIENT.get(
+            f"https://api.elevenlabs.io/v1/voices/{DEFAULT_VOICE_ID}",
+            headers={"xi-api-key": ELEVENLABS_API_KEY}
+        )
+        logger.info(f"ElevenLabs connection warmed up (status {response.status_code}).")
+    except httpx.HTTPError as e:
+        logger.warning(f"ElevenLabs warm-up request failed: {e}")
+
+async def close_tts_client() -> None:
+    """Closes the shared HTTP client. Call once on application shutdown."""
+    await _CLIENT.aclose()
+    logger.info("ElevenLabs HTTP client closed.")
+
+class TextToSpeechError(Exception):
+    """Raised when text could not be converted to speech, including when the audio stream breaks off."""
+
+def _tts_cache_key(text: str) -> bytes:
+    """Builds the cache key for a phrase spoken with the current voice, model and output format."""
+    return hashlib.md5(f"{DEFAULT_VOICE_ID}|{TTS_MODEL_ID}|{TTS_OUTPUT_FORMAT}|{text}".encode("utf-8")).digest()
+
+async def convert_text_to_speech_stream(text: str) -> AsyncIterator[bytes]:
+    """
+    Converts text to speech using the ElevenLabs API and yields the audio data as it arrives.
+    Audio for short phrases is cached, and repeated phrases are served from the cache.
 
     Args:
         text: The text content to convert to speech.
 
-    Returns:
-        The audio data as bytes (e.g., MP3), or None if conversion fails.
+    Yields:
+        Chunks of audio data (e.g., MP3). Nothing is yielded for empty text.
+
+    Raises:
+        TextToSpeechError: If conversion fails. Chunks yielded before a mid-stream failure
+                           are an incomplete clip and should be discarded.
     """
     if not ELEVENLABS_API_KEY:
         logger.error("ElevenLabs API key not found in environment variables.")
-        return None
+        raise TextToSpeechError("ElevenLabs API key is not configured.")
     if not text:
         logger.warning("No text provided for TTS conversion.")
-        return None
+        return
+
+    cacheable = len(text) <= TTS_CACHE_MAX_TEXT_LENGTH
+    if cacheable:
+        cache_key = _tts_cache_key(text)
+        cached_audio = _TTS_CACHE.get(cache_key)
+        if cached_audio is not None:
+            _TTS_CACHE.move_to_end(cache_key)
+            logger.info(f"TTS cache hit for text: '{text[:50]}...'")
+            yield cached_audio
+            return
 
     headers = {
         "Accept": "audio/mpeg",
@@ -42,7 +103,7 @@ def convert_text_to_speech_stream(text: str) -> bytes | None:
     # Documentation: https://elevenlabs.io/docs/api-reference/text-to-speech-stream
     data = {
         "text": text,
-        "model_id": "eleven_multilingual_v2", # Or another suitable model
+        "model_id": TTS_MODEL_ID,
         "voice_settings": {
             "stability": 0.5,
             "similarity_boost": 0.75,
@@ -51,48 +112,68 @@ def convert_text_to_speech_stream(text: str) -> bytes | None:
         }
     }
 
+    audio_chunks: List[bytes] = []
     try:
         logger.info(f"Requesting TTS from ElevenLabs for text: '{text[:50]}...'")
-        response = requests.post(TTS_URL, json=data, headers=headers, stream=True)
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+        async with _CLIENT.stream(
+            "POST", TTS_URL, params={"output_format": TTS_OUTPUT_FORMAT}, json=data, headers=headers
+        ) as response:
+            if response.is_error:
+                await response.aread() # Load the error body so it can be logged below
+            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
 
-        # Read the audio content from the streaming response
-        audio_content = b""
-        for chunk in response.iter_content(chunk_size=1024):
-            if chunk:
-                audio_content += chunk
+            async for chunk in response.aiter_bytes(chunk_size=4096):
+                if cacheable:
+                    audio_chunks.append(chunk)
+                yield chunk
 
         logger.info("TTS audio stream received successfully.")
-        return audio_content
 
-    except requests.exceptions.RequestException as e:
+        # Only cache audio that was received completely
+        if cacheable and audio_chunks:
+            _TTS_CACHE[cache_key] = b"".join(audio_chunks)
+            if len(_TTS_CACHE) > TTS_CACHE_MAX_ENTRIES:
+                _TTS_CACHE.popitem(last=False) # Evict the least recently used entry
+
+    except httpx.HTTPStatusError as e:
         logger.error(f"Error calling ElevenLabs API: {e}", exc_info=True)
         # Log detailed error if available in response
         try:
-            error_detail = response.json()
+            error_detail = e.response.json()
             logger.error(f"ElevenLabs API error detail: {error_detail}")
         except Exception:
-            logger.error(f"ElevenLabs API response content: {response.content}")
-        return None
+            logger.error(f"ElevenLabs API response content: {e.response.content}")
+        raise TextToSpeechError(f"ElevenLabs API returned status {e.response.status_code}.") from e
+    except httpx.HTTPError as e:
+        logger.error(f"Error calling ElevenLabs API: {e}", exc_info=True)
+        raise TextToSpeechError(f"Error calling ElevenLabs API: {e}") from e
     except Exception as e:
         logger.error(f"An unexpected error occurred during TTS conversion: {e}", exc_info=True)
-        return None
+        raise TextToSpeechError(f"Unexpected error during TTS conversion: {e}") from e
 
 # Example usage (for testing purposes)
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     test_text = "Hello! This is a test of the ElevenLabs text-to-speech conversion."
     logger.info(f"Testing TTS with text: '{test_text}'")
-    audio_bytes = convert_text_to_speech_stream(test_text)
+    output_filename = "test_output.mp3"
 
-    if audio_bytes:
-        output_filename = "test_output.mp3"
-        try:
-            with open(output_filename, "wb") as f:
-                f.write(audio_bytes)
+    async def save_audio(text: str, filename: str) -> int:
+        # Write chunks as they arrive instead of accumulating the whole clip in memory
+        bytes_written = 0
+        with open(filename, "wb") as f:
+            async for chunk in convert_text_to_speech_stream(text):
+                bytes_written += f.write(chunk)
+        return bytes_written
+
+    try:
+        if asyncio.run(save_audio(test_text, output_filename)):
             logger.info(f"TTS audio saved successfully to {output_filename}")
             print(f"\nTTS audio saved to {output_filename}. You can play this file.")
-        except Exception as e:
-            logger.error(f"Error saving TTS audio to file: {e}")
-            print("\nFailed to save TTS audio.")
-    else:
+        else:
+            print("\nTTS conversion failed.")
+    except TextToSpeechError:
         print("\nTTS conversion failed.")
+    except Exception as e:
+        logger.error(f"Error saving TTS audio to file: {e}")
+        print("\nFailed to save TTS audio.")
@@ -1,16 +1,11 @@
 import google.generativeai as genai
+import asyncio
 import os
 import logging
-from dotenv import load_dotenv
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables from .env file
-load_dotenv()
-
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
@@ -31,9 +26,12 @@ GENERATION_CONFIG = {
     "temperature": 0.7, # Controls randomness. Lower for more predictable, higher for more creative.
     "top_p": 1.0,       # Nucleus sampling parameter
     "top_k": 1,         # Top-k sampling parameter
-    "max_output_tokens": 2048, # Maximum length of the response
+    "max_output_tokens": 256, # Maximum length of the response; spoken replies should stay short
 }
 
+# Replies are read aloud, so keep them brief: shorter text means faster generation and synthesis
+SYSTEM_INSTRUCTION = "Respond concisely in 1-2 sentences for text-to-speech playback."
+
 # --- Safety Settings ---
 # See https://ai.google.dev/docs/concepts#safety_settings
 SAFETY_SETTINGS = [
@@ -46,9 +44,44 @@ SAFETY_SETTINGS = [
 # Use a model suitable for chat, like 'gemini-pro' or 'gemini-1.5-flash' etc.
 MODEL_NAME = "gemini-1.5-flash" # Or "gemini-pro" or other available models
 
-def generate_response_with_gemini(user_text: str, history: List[Dict[str, str]] = None) -> str | None:
+# Shared model instance, built once and reused by every request
+_MODEL = genai.GenerativeModel(
+    model_name=MODEL_NAME,
+    generation_config=GENERATION_CONFIG,
+    safety_settings=SAFETY_SETTINGS,
+    system_instruction=SYSTEM_INSTRUCTION
+)
+
+def _empty_response_message(response) -> str:
     """
-    Generates a response using the Google Gemini API based on user input and conversation history.
+    Builds the reply sent when Gemini returns no text, either because of a safety block
+    or for an unknown reason.
+    """
+    if response.prompt_feedback.block_reason:
+        logger.warning(f"Response blocked due to safety settings: {response.prompt_feedback.block_reason}")
+        return f"I cannot respond to that due to safety guidelines ({response.prompt_feedback.block_reason})."
+    logger.warning("Gemini response was empty or blocked for unknown reasons.")
+    return "I'm sorry, I couldn't generate a response for that."
+
+def warm_up_gemini() -> None:
+    """
+    Issues a cheap count_tokens call so the Gemini client sets up its channel before the first
+    user request. Blocking; run it in a worker thread. Failures are logged and otherwise ignored.
+    """
+    if not GEMINI_API_KEY:
+        logger.warning("Skipping Gemini warm-up: API key not configured.")
+        return
+    try:
+        _MODEL.count_tokens("hi")
+        logger.info("Gemini connection warmed up.")
+    except Exception as e:
+        logger.warning(f"Gemini warm-up request failed: {e}")
+
+async def stream_response_with_gemini(user_text: str, history: List[Dict[str, str]] = None) -> AsyncIterator[str]:
+    """
+    Streams a response from the Google Gemini API, yielding text chunks as they are generated.
+    The blocking SDK iterator runs in a worker thread and hands chunks over through an asyncio.Queue,
+    so callers can start processing the beginning of the reply while generation continues.
 
     Args:
         user_text: The latest text input from the user.
@@ -56,71 +89,86 @@ def generate_response_with_gemini(user_text: str, history: List[Dict[str, str]]
                  where each dictionary has 'role' ('user' or 'model') and 'parts' (list of strings).
                  Example: [{'role': 'user', 'parts': ['Hello']}, {'role': 'model', 'parts': ['Hi there!']}]
 
-    Returns:
-        The generated text response from Gemini, or None if generation fails.
+    Yields:
+        Text chunks of the generated response. Nothing is yielded if the API key or user text is missing.
+
+    Raises:
+        Exception: The error raised by the Gemini SDK if generation fails, including partway through
+                   the stream (chunks yielded before the failure are an incomplete reply).
     """
     if not GEMINI_API_KEY:
         logger.error("Cannot generate response: Gemini API key is not configured.")
-        return None
+        return
     if not user_text:
         logger.warning("No user text provided for Gemini.")
-        return None
-
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[str | Exception | None] = asyncio.Queue()
+
+    def produce_chunks() -> None:
+        try:
+            if history:
+                chat = _MODEL.start_chat(history=history)
+                logger.info(f"Starting streaming chat with history ({len(history)} items). Sending message: '{user_text[:50]}...'")
+                response = chat.send_message(user_text, stream=True)
+            else:
+                logger.info(f"Streaming single message (no history): '{user_text[:50]}...'")
+                response = _MODEL.generate_content(user_text, stream=True)
+
+            received_text = False
+            for chunk in response:
+                if chunk.parts:
+                    received_text = True
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+
+            # Check for safety blocks or empty response
+            if not received_text:
+                loop.call_soon_threadsafe(queue.put_nowait, _empty_response_message(response))
+            logger.info("Gemini response stream completed.")
+
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {e}", exc_info=True)
+            # Hand the error to the consumer so a truncated reply isn't mistaken for a complete one
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            # Sentinel: signals the consumer that no more chunks will arrive
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    producer = asyncio.create_task(asyncio.to_thread(produce_chunks))
     try:
-        model = genai.GenerativeModel(
-            model_name=MODEL_NAME,
-            generation_config=GENERATION_CONFIG,
-            safety_settings=SAFETY_SETTINGS
-        )
-
-        # Start a chat session if history is provided
-        if history:
-            chat = model.start_chat(history=history)
-            logger.info(f"Starting chat with history ({len(history)} items). Sending message: '{user_text[:50]}...'")
-            response = chat.send_message(user_text, stream=False) # Use stream=True for streaming responses
-        else:
-            # If no history, send a single message
-            logger.info(f"Sending single message (no history): '{user_text[:50]}...'")
-            response = model.generate_content(user_text, stream=False)
-
-        # Check for safety blocks or empty response
-        if not response.parts:
-             if response.prompt_feedback.block_reason:
-                 logger.warning(f"Response blocked due to safety settings: {response.prompt_feedback.block_reason}")
-                 return f"I cannot respond to that due to safety guidelines ({response.prompt_feedback.block_reason})."
-             else:
-                 logger.warning("Gemini response was empty or blocked for unknown reasons.")
-                 return "I'm sorry, I couldn't generate a response for that."
-
-        generated_text = response.text
-        logger.info(f"Gemini response received: '{generated_text[:100]}...'")
-        return generated_text
-
-    except Exception as e:
-        logger.error(f"Error calling Gemini API: {e}", exc_info=True)
-        # Attempt to get more details if available (might vary based on SDK version/error type)
-        # if hasattr(e, 'response') and e.response:
-        #     logger.error(f"Gemini API error details: {e.response.text}")
-        return None
+        while (chunk := await queue.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        await producer
 
 # Example usage (for testing purposes)
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     test_query = "What is the weather like in London today?"
     logger.info(f"Testing Gemini API with query: '{test_query}'")
 
+    async def collect_response(user_text: str, history: List[Dict[str, str]] = None) -> str | None:
+        try:
+            return "".join([chunk async for chunk in stream_response_with_gemini(user_text, history=history)]) or None
+        except Exception:
+            return None
+
     # Example with history
     test_history = [
         {'role': 'user', 'parts': ['What is the capital of France?']},
         {'role': 'model', 'parts': ['The capital of France is Paris.']}
     ]
-    response_with_history = generate_response_with_gemini(test_query, history=test_history)
+    response_with_history = asyncio.run(collect_response(test_query, history=test_history))
     if response_with_history:
         print(f"\nResponse (with history):\n{response_with_history}")
     else:
         print("\nGemini API call failed (with history).")
 
     # Example without history
-    response_without_history = generate_response_with_gemini(test_query)
+    response_without_history = asyncio.run(collect_response(test_query))
     if response_without_history:
         print(f"\nResponse (without history):\n{response_without_history}")
     else:
@@ -1,83 +1,98 @@
-import speech_recognition as sr
-from pydub import AudioSegment
-import io
+from faster_whisper import WhisperModel
 import os
-import tempfile
 import logging
+import threading
+from typing import BinaryIO
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Ensure ffmpeg/ffprobe are accessible if not in PATH
-# Example: AudioSegment.converter = "/path/to/ffmpeg"
-# Example: AudioSegment.ffprobe = "/path/to/ffprobe"
+# --- Whisper Model Configuration ---
+# Model size: "tiny", "base", "small", "medium", "large-v3", ...
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "small")
+# Use device="cuda" with compute_type="float16" on a GPU; int8 keeps CPU inference fast and small
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
 
-def convert_audio_to_text(audio_file_path: str, language: str = "en-US") -> str | None:
+# Voice activity detection (Silero VAD, bundled with faster-whisper) drops leading, trailing and
+# long internal silences before decoding, so Whisper only processes the voiced audio
+VAD_PARAMETERS = {
+    "min_silence_duration_ms": 500, # Silences shorter than this are kept
+    "speech_pad_ms": 200,           # Padding kept around each speech segment
+}
+
+# Shared model instance, loaded on first use rather than at import: a process that only imports
+# this module (e.g. the uvicorn parent that spawns workers) never holds a copy
+_MODEL: WhisperModel | None = None
+_MODEL_LOCK = threading.Lock()
+
+def load_whisper_model() -> WhisperModel:
+    """
+    Returns the shared Whisper model, loading it on the first call. Blocking and thread-safe;
+    call it from a worker thread at startup so the first request doesn't pay for the load.
     """
-    Converts an audio file to text using Google Web Speech API via SpeechRecognition.
-    Handles various audio formats by converting them to WAV first using pydub.
+    global _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            logger.info(f"Loading Whisper model '{WHISPER_MODEL_SIZE}' ({WHISPER_DEVICE}, {WHISPER_COMPUTE_TYPE})...")
+            _MODEL = WhisperModel(WHISPER_MODEL_SIZE, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE_TYPE)
+            logger.info("Whisper model loaded successfully.")
+    return _MODEL
+
+def convert_audio_to_text(audio_file: str | BinaryIO, language: str = "en-US") -> str | None:
+    """
+    Converts audio to text using a local faster-whisper model.
+    Any format ffmpeg can decode is accepted; no intermediate WAV conversion is needed.
+    Silent stretches are trimmed with voice activity detection before transcription.
 
     Args:
-        audio_file_path: The path to the input audio file.
+        audio_file: The path to the input audio file, or a binary file-like object
+                    (e.g. an upload's spooled file) positioned at the start of the audio.
         language: The language code for speech recognition (e.g., "en-US", "hi-IN").
+                  Only the language part ("en", "hi") is used by Whisper.
 
     Returns:
         The transcribed text as a string, or None if transcription fails.
+
+    Raises:
+        Exception: If the Whisper model cannot be loaded (e.g. the model download fails).
+                   This is a server-side problem, not a problem with the audio.
     """
-    recognizer = sr.Recognizer()
     text = None
-    temp_wav_fd = None
-    temp_wav_path = None
+
+    if isinstance(audio_file, str) and not os.path.isfile(audio_file):
+        logger.error(f"Audio file not found at path: {audio_file}")
+        return None
+
+    # Loaded outside the try below so model errors propagate instead of being reported as bad audio
+    model = load_whisper_model()
 
     try:
-        # Load audio file using pydub (handles various formats)
-        logger.info(f"Loading audio file: {audio_file_path}")
-        audio = AudioSegment.from_file(audio_file_path)
-        logger.info("Audio file loaded successfully.")
-
-        # Create a temporary WAV file because SpeechRecognition works best with WAV
-        temp_wav_fd, temp_wav_path = tempfile.mkstemp(suffix=".wav")
-        os.close(temp_wav_fd) # Close the file descriptor, pydub will handle the file
-        logger.info(f"Exporting audio to temporary WAV file: {temp_wav_path}")
-        audio.export(temp_wav_path, format="wav")
-        logger.info("Audio exported to WAV successfully.")
-
-        # Use the temporary WAV file with SpeechRecognition
-        with sr.AudioFile(temp_wav_path) as source:
-            logger.info("Adjusting for ambient noise...")
-            # recognizer.adjust_for_ambient_noise(source) # Optional: Adjust for noise
-            logger.info("Listening to audio file...")
-            audio_data = recognizer.record(source)
-            logger.info("Audio data recorded.")
-
-        # Recognize speech using Google Web Speech API with the specified language
-        logger.info(f"Attempting speech recognition for language: {language}...")
-        text = recognizer.recognize_google(audio_data, language=language)
-        logger.info(f"Speech recognized successfully: {text}")
-
-    except sr.UnknownValueError:
-        logger.error(f"Google Web Speech API could not understand the audio for language {language}.")
-    except sr.RequestError as e:
-        logger.error(f"Could not request results from Google Web Speech API; {e}")
-    except FileNotFoundError:
-        logger.error(f"Audio file not found at path: {audio_file_path}")
+        whisper_language = language.split("-")[0].lower()
+        logger.info(f"Attempting speech recognition for language: {whisper_language}...")
+        segments, _ = model.transcribe(
+            audio_file,
+            language=whisper_language,
+            vad_filter=True,
+            vad_parameters=VAD_PARAMETERS
+        )
+
+        # Segments are generated lazily; decoding happens while joining them
+        text = " ".join(segment.text.strip() for segment in segments).strip()
+        if text:
+            logger.info(f"Speech recognized successfully: {text}")
+        else:
+            logger.error(f"Whisper could not recognize any speech in the audio for language {whisper_language}.")
+            text = None
+
     except Exception as e:
         logger.error(f"An unexpected error occurred during audio processing: {e}", exc_info=True)
-    finally:
-        # Clean up the temporary WAV file
-        if temp_wav_path and os.path.exists(temp_wav_path):
-            try:
-                os.remove(temp_wav_path)
-                logger.info(f"Temporary WAV file removed: {temp_wav_path}")
-            except Exception as e:
-                logger.error(f"Error removing temporary file {temp_wav_path}: {e}")
 
     return text
 
 # Example usage (for testing purposes)
 if __name__ == "__main__":
-    # Create a dummy audio file for testing (requires ffmpeg installed)
+    logging.basicConfig(level=logging.INFO)
+    # Create a dummy audio file for testing
     # You should replace this with a real audio file path for actual testing
     test_file = "test_audio.mp3" # Or .wav, .ogg, etc.
     if not os.path.exists(test_file):